@@ -0,0 +1,32 @@
+"""一次性生成省份几何的WKB快照，加速后续启动
+
+从GeoJSON完整加载一遍省份几何，再把 {省份代码: WKB字节串} 序列化到
+res/provinces.pkl。main.load_province_geometries发现快照存在时会直接
+反序列化，跳过JSON解析和Python层的几何构造。
+
+用法（在仓库根目录运行）: python src/build_cache.py
+GeoJSON更新后需要重新生成快照。
+"""
+import os
+import pickle
+
+import shapely
+
+import main
+
+
+def build():
+    # 确保从GeoJSON源文件构建，而不是旧快照
+    if os.path.exists(main.PROVINCE_CACHE_PATH):
+        os.remove(main.PROVINCE_CACHE_PATH)
+
+    main.load_province_geometries()
+    snapshot = {code: shapely.to_wkb(geom)
+                for code, geom in main.province_geometries.items()}
+    with open(main.PROVINCE_CACHE_PATH, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Wrote {len(snapshot)} geometries to {main.PROVINCE_CACHE_PATH}")
+
+
+if __name__ == '__main__':
+    build()
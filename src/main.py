@@ -1,13 +1,73 @@
+import os
+
+# gevent协作式I/O：打补丁后requests等待WMS响应时会让出，单个worker
+# 即可并发处理一个视口发来的几十个瓦片请求，而不是逐个串行阻塞。
+# 生产环境: gunicorn -k gevent -w 4 --worker-connections 500 main:app
+# （gunicorn的gevent worker会自动打补丁；其他启动方式通过环境变量开启）
+if os.getenv('UOM_PROXY_GEVENT'):
+    from gevent import monkey
+    monkey.patch_all()
+
+# gevent打补丁后select.epoll被移除，而trio在类定义阶段就引用它，
+# 会让下面httpx→httpcore对trio的可选import直接崩溃。把trio标记为
+# 不可导入，让httpcore落入ImportError分支。gunicorn -k gevent在
+# import本模块之前就打好了补丁，所以这里按补丁状态统一判断
+import sys
+try:
+    from gevent import monkey as _monkey
+    if _monkey.is_module_patched('select'):
+        sys.modules.setdefault('trio', None)
+except ImportError:
+    pass
+
 from flask import Flask
+import functools
+import logging
 import math
-import requests
-import json
-import os
-from shapely.geometry import Point, Polygon, MultiPolygon
+import threading
+from itertools import chain, combinations
+import hashlib
+import pickle
+import httpx
+import orjson
+import numpy as np
+from numba import njit
+import diskcache
+from cachetools import LRUCache
+import shapely
+from shapely.geometry import box, shape
+from shapely.strtree import STRtree
+
+# 日志级别通过环境变量控制；请求路径上的logger.debug在未开启DEBUG时
+# 只做一次级别判断，开销接近于零，而print每次都要格式化并刷新stdout
+logging.basicConfig(level=os.getenv('UOM_PROXY_LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
+# httpx默认对每个请求打一条INFO日志，热路径上只保留告警
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 app = Flask(__name__)
 WMS_URL = f"https://uom.caac.gov.cn/map/airspace/wms?token={os.getenv('WMS_TOKEN')}"
 
+# 复用TCP/TLS连接访问WMS后端，避免每个瓦片请求都重新握手。
+# 开启HTTP/2后一条TLS连接即可复用承载视口并发的几十个WMS请求，
+# 消除队头阻塞；上游不支持HTTP/2时httpx自动回退HTTP/1.1 keep-alive
+SESSION = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    ),
+    headers={'Accept-Encoding': 'gzip'},
+)
+
+# 瓦片PNG两级缓存：内存LRU保存热点瓦片，磁盘缓存跨重启保留。
+# LRUCache连get都会调整内部访问顺序，gthread多线程worker下必须加锁；
+# diskcache自身是线程/进程安全的
+TILE_CACHE_TTL = 86400  # 秒
+TILE_MEM_CACHE = LRUCache(maxsize=10000)
+TILE_MEM_LOCK = threading.Lock()
+TILE_DISK_CACHE = diskcache.Cache('./tile_cache')
+
 # 修正后的省份分组映射
 PROVINCE_GROUPS = {
     'north': ['12', '13', '14', '15'],                   # 华北地区
@@ -21,48 +81,190 @@ PROVINCE_GROUPS = {
 # 反转映射：从省份代码到所属组
 CODE_TO_GROUP = {code: group for group, codes in PROVINCE_GROUPS.items() for code in codes}
 
+# 低缩放级别返回全部分组
+_ALL_GROUPS = frozenset(PROVINCE_GROUPS)
+
+# 每个省份代码对应的WMS图层名与统一样式名，模块加载时生成一次，
+# 所有分组组合共享同一批字符串对象
+LAYER_NAME = {code: f"QGSFKYFW:sf{code}0000" for code in CODE_TO_GROUP}
+STYLE_NAME = "QGSFKYFW:shifeikongyu"
+
+def _build_group_layers():
+    """预先为六个分组的全部64种组合生成WMS的layers/styles字符串"""
+    table = {}
+    group_names = list(PROVINCE_GROUPS)
+    for r in range(len(group_names) + 1):
+        for subset in combinations(group_names, r):
+            chosen = set(subset)
+            codes = list(chain.from_iterable(
+                PROVINCE_GROUPS[g] for g in group_names if g in chosen))
+            layers = ",".join(LAYER_NAME[code] for code in codes)
+            styles = ",".join([STYLE_NAME] * len(codes))
+            table[frozenset(subset)] = (layers, styles)
+    return table
+
+# 分组组合 -> (layers, styles)，启动时一次性生成，请求路径只做字典查找
+GROUP_LAYERS = _build_group_layers()
+
 # 缓存省份几何信息
 province_geometries = {}
+# 分片索引：复杂省份轮廓（新疆、内蒙古有数万条边）递归四分成小块，
+# STRtree索引分片而非完整省份，精确判断只需遍历数百条边。
+# 三个列表下标对齐：分片几何、所属省份代码、分片包围盒
+shard_geometries = []
+shard_codes = []
+shard_bboxes = []
+province_tree = None
+
+# 单个分片允许的最大顶点数
+MAX_SHARD_COORDS = 256
+
+# 省份几何WKB快照，由src/build_cache.py生成；存在时启动直接反序列化，
+# 跳过JSON解析和Python层的几何构造（容器重启/自动扩容场景下收益明显）
+PROVINCE_CACHE_PATH = './res/provinces.pkl'
+
+# 粗分组栅格：在中国范围上铺一张GRID_SIZE x GRID_SIZE的uint8网格，
+# 每个格子存所在分组的编号，边界附近/境外为GRID_AMBIGUOUS。
+# 瓦片整体落在同一分组的格子上时，查询退化为一次数组切片比较
+GRID_SIZE = 1024
+GRID_AMBIGUOUS = 255
+_GROUP_NAMES = list(PROVINCE_GROUPS)
+group_grid = None
+grid_extent = None  # (lng_min, lat_min, lng_max, lat_max)
+
+def _build_group_grid():
+    """按格子中心点归属省份栅格化分组编号，相邻格子分组不一致的标记为模糊"""
+    global group_grid, grid_extent
+    bounds = np.array([geom.bounds for geom in province_geometries.values()])
+    lng_min, lat_min = bounds[:, 0].min(), bounds[:, 1].min()
+    lng_max, lat_max = bounds[:, 2].max(), bounds[:, 3].max()
+    cell_w = (lng_max - lng_min) / GRID_SIZE
+    cell_h = (lat_max - lat_min) / GRID_SIZE
+    cell_lngs = lng_min + (np.arange(GRID_SIZE) + 0.5) * cell_w
+    cell_lats = lat_min + (np.arange(GRID_SIZE) + 0.5) * cell_h
+
+    grid = np.full((GRID_SIZE, GRID_SIZE), GRID_AMBIGUOUS, dtype=np.uint8)
+    for code, geom in province_geometries.items():
+        if code not in CODE_TO_GROUP:
+            continue
+        group_id = _GROUP_NAMES.index(CODE_TO_GROUP[code])
+        # 只测试省份包围盒覆盖的格子窗口，避免全网格做PIP
+        bx0, by0, bx1, by1 = geom.bounds
+        ix = np.nonzero((cell_lngs >= bx0) & (cell_lngs <= bx1))[0]
+        iy = np.nonzero((cell_lats >= by0) & (cell_lats <= by1))[0]
+        if ix.size == 0 or iy.size == 0:
+            continue
+        sub_lngs, sub_lats = np.meshgrid(cell_lngs[ix], cell_lats[iy])
+        shapely.prepare(geom)
+        mask = shapely.contains_xy(geom, sub_lngs, sub_lats)
+        grid[np.ix_(iy, ix)] = np.where(mask, group_id, grid[np.ix_(iy, ix)])
+
+    # 3x3邻域不一致的格子视为靠近分组边界，标记模糊走shapely精确路径
+    core = grid[1:-1, 1:-1]
+    uniform = np.ones_like(core, dtype=bool)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            uniform &= grid[1+dy:GRID_SIZE-1+dy, 1+dx:GRID_SIZE-1+dx] == core
+    final = np.full_like(grid, GRID_AMBIGUOUS)
+    final[1:-1, 1:-1] = np.where(uniform, core, GRID_AMBIGUOUS)
+
+    group_grid = final
+    grid_extent = (lng_min, lat_min, lng_max, lat_max)
+
+def _grid_lookup(lngs, lats):
+    """瓦片采样点覆盖的格子同属一个明确分组时返回该分组，否则返回None"""
+    lng_min, lat_min, lng_max, lat_max = grid_extent
+    cell_w = (lng_max - lng_min) / GRID_SIZE
+    cell_h = (lat_max - lat_min) / GRID_SIZE
+    ix0 = int((lngs.min() - lng_min) / cell_w)
+    ix1 = int((lngs.max() - lng_min) / cell_w)
+    iy0 = int((lats.min() - lat_min) / cell_h)
+    iy1 = int((lats.max() - lat_min) / cell_h)
+    if ix0 < 0 or iy0 < 0 or ix1 >= GRID_SIZE or iy1 >= GRID_SIZE:
+        return None  # 瓦片超出栅格范围，交给精确路径处理
+    sub = group_grid[iy0:iy1+1, ix0:ix1+1]
+    first = sub[0, 0]
+    if first != GRID_AMBIGUOUS and (sub == first).all():
+        return frozenset({_GROUP_NAMES[first]})
+    return None
+
+def _split_geometry(geom, depth=0):
+    """递归按包围盒四分几何体，直到每个分片顶点数不超过MAX_SHARD_COORDS"""
+    if shapely.get_num_coordinates(geom) <= MAX_SHARD_COORDS or depth >= 8:
+        return [geom]
+    minx, miny, maxx, maxy = geom.bounds
+    midx, midy = (minx + maxx) / 2, (miny + maxy) / 2
+    pieces = []
+    for cell in (box(minx, miny, midx, midy), box(midx, miny, maxx, midy),
+                 box(minx, midy, midx, maxy), box(midx, midy, maxx, maxy)):
+        part = geom.intersection(cell)
+        if part.is_empty or part.area == 0:
+            continue
+        pieces.extend(_split_geometry(part, depth + 1))
+    return pieces
 
 def load_province_geometries():
-    global province_geometries
+    global province_geometries, shard_geometries, shard_codes, shard_bboxes, province_tree
+    # 重置容器，保证重复调用（如build_cache重建快照后重新加载）不会累积
+    province_geometries = {}
+    shard_geometries = []
+    shard_codes = []
+    shard_bboxes = []
+    province_tree = None
     try:
-        with open('./res/china_new.geojson', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        for feature in data.get('features', []):
-            properties = feature.get('properties', {})
-            code = str(properties.get('省级码', ''))[:2]  # 使用省级码作为省份代码
-            
-            if not code:
-                print(f"Skipping feature without valid code: {properties}")
-                continue
-                
-            geometry = feature.get('geometry', {})
-            geometry_type = geometry.get('type')
-            coordinates = geometry.get('coordinates', [])
-            
-            try:
-                if geometry_type == 'Polygon':
-                    exterior = coordinates[0]
-                    interiors = coordinates[1:]
-                    province_geometries[code] = Polygon(exterior, interiors)
-                elif geometry_type == 'MultiPolygon':
-                    polygons = []
-                    for polygon_coords in coordinates:
-                        exterior = polygon_coords[0]
-                        interiors = polygon_coords[1:]
-                        polygons.append(Polygon(exterior, interiors))
-                    province_geometries[code] = MultiPolygon(polygons)
-                
-                print(f"Loaded geometry for code {code}")
-            except Exception as e:
-                print(f"Error processing geometry for code {code}: {e}")
+        if os.path.exists(PROVINCE_CACHE_PATH):
+            # WKB快照直接还原GEOS几何，比解析GeoJSON快一个数量级
+            with open(PROVINCE_CACHE_PATH, 'rb') as f:
+                snapshot = pickle.load(f)
+            for code, wkb_blob in snapshot.items():
+                province_geometries[code] = shapely.from_wkb(wkb_blob)
+            logger.info("Loaded geometries from snapshot %s", PROVINCE_CACHE_PATH)
+        else:
+            # orjson在C层解析JSON，比标准库快3-5倍
+            with open('./res/china_new.geojson', 'rb') as f:
+                data = orjson.loads(f.read())
+
+            for feature in data.get('features', []):
+                properties = feature.get('properties', {})
+                code = str(properties.get('省级码', ''))[:2]  # 使用省级码作为省份代码
+
+                if not code:
+                    logger.warning("Skipping feature without valid code: %s", properties)
+                    continue
+
+                try:
+                    # shape()直接按geometry的type构造对应几何，无需手工拆解坐标
+                    province_geometries[code] = shape(feature.get('geometry', {}))
+                    logger.debug("Loaded geometry for code %s", code)
+                except Exception as e:
+                    logger.warning("Error processing geometry for code %s: %s", code, e)
         
-        print(f"Loaded {len(province_geometries)} province geometries")
+        # 切分复杂轮廓并对每个分片预处理、缓存包围盒，加载时一次性完成
+        for code, geometry in province_geometries.items():
+            for shard in _split_geometry(geometry):
+                shapely.prepare(shard)
+                shard_geometries.append(shard)
+                shard_codes.append(code)
+                shard_bboxes.append(shard.bounds)
+
+        # 构建STRtree空间索引，query返回分片下标，通过shard_codes映射回省份代码
+        province_tree = STRtree(shard_geometries)
+
+        # 构建粗分组栅格，为绝大多数瓦片提供O(1)查询
+        _build_group_grid()
+
+        logger.info("Loaded %d province geometries (%d shards)",
+                    len(province_geometries), len(shard_geometries))
     except Exception as e:
-        print(f"Error loading province geometries: {e}")
+        logger.error("Error loading province geometries: %s", e)
         province_geometries = {}
+        shard_geometries = []
+        shard_codes = []
+        shard_bboxes = []
+        province_tree = None
+        global group_grid, grid_extent
+        group_grid = None
+        grid_extent = None
 
 
 # def calculate_bbox(z, x, y, tile_size=256):
@@ -98,21 +300,21 @@ def load_province_geometries():
     
 #     return minx, miny, maxx, maxy
 
+@functools.lru_cache(maxsize=65536)
+@njit(cache=True, fastmath=True)
 def calculate_bbox(z, x, y, tile_size=256):
     """
     计算Google Maps XYZ瓦片系统中瓦片在EPSG:3857 (Web Mercator) 下的边界框
-    
+
     参数:
     z (int): 缩放级别
     x (int): XYZ系统中的X坐标
     y (int): XYZ系统中的Y坐标
     tile_size (int): 瓦片像素大小，默认为256
-    
+
     返回:
     tuple: 边界框坐标 (minx, miny, maxx, maxy)，单位为米
     """
-    import math
-    
     # 常量定义
     earth_radius = 6378137  # WGS84椭球体半径（米）
     origin_shift = 2 * math.pi * earth_radius / 2.0  # 半周长
@@ -129,6 +331,7 @@ def calculate_bbox(z, x, y, tile_size=256):
     return minx, miny, maxx, maxy
 
 
+@njit(cache=True, fastmath=True)
 def mercator_to_lnglat(x, y):
     """将EPSG:3857坐标转换为经纬度"""
     earth_radius = 6378137
@@ -136,10 +339,47 @@ def mercator_to_lnglat(x, y):
     lat = (math.atan(math.exp(y / earth_radius)) * 2 - math.pi/2) * 180.0 / math.pi
     return lng, lat
 
+def mercator_to_lnglat_arr(xs, ys):
+    """mercator_to_lnglat的numpy数组版本，一次ufunc调用转换整批坐标"""
+    earth_radius = 6378137
+    lng = xs * (180.0 / (math.pi * earth_radius))
+    lat = (np.arctan(np.exp(ys / earth_radius)) * 2 - math.pi/2) * (180.0 / math.pi)
+    return lng, lat
+
+# 启动时用哑调用触发一次JIT编译，避免首个请求支付编译成本
+calculate_bbox(0, 0, 0)
+mercator_to_lnglat(0.0, 0.0)
+
+def _match_shards(shard_idxs, lngs, lats, matched_provinces):
+    """批量判断采样点落在哪些候选分片内，命中的省份代码加入matched_provinces
+
+    分片的切割线落在省份内部，用intersects而非contains做判断，
+    避免恰好落在切割线上的采样点被两侧分片同时漏掉。
+    """
+    for idx in shard_idxs:
+        code = shard_codes[idx]
+        if code in matched_provinces:
+            continue
+        # 先做廉价的包围盒数值判断，再调用shapely精确判断
+        bx0, by0, bx1, by1 = shard_bboxes[idx]
+        in_bbox = (lngs >= bx0) & (lngs <= bx1) & (lats >= by0) & (lats <= by1)
+        if not in_bbox.any():
+            continue
+        if shapely.intersects_xy(shard_geometries[idx], lngs, lats).any():
+            matched_provinces.add(code)
+
+@functools.lru_cache(maxsize=131072)
 def get_province_group(z, x, y):
-    """Determine which predefined province group contains this tile"""
+    """Determine which predefined province groups contain this tile
+
+    返回分组名的frozenset，作为GROUP_LAYERS的查找键。
+
+    地图客户端会反复请求相同瓦片（平移、刷新、CDN重试），
+    缓存命中时完全跳过shapely几何运算。结果只依赖(z,x,y)和启动时
+    加载的不可变几何数据，可以安全缓存。
+    """
     if z < 6:  # Show all regions at low zoom levels
-        return sum(PROVINCE_GROUPS.values(), [])
+        return _ALL_GROUPS
         
     # 计算瓦片的中心点和四个角点
     minx, miny, maxx, maxy = calculate_bbox(z, x, y)
@@ -163,68 +403,70 @@ def get_province_group(z, x, y):
         mercator_to_lnglat(maxx, (miny+maxy)/2),  # 右边缘中点
     ]
     
-    # 检查每个点位于哪个省份
+    # 快速路径：z>=6时瓦片很小，先用瓦片整体的经纬度范围查询STRtree，
+    # 得到少量候选分片，采样点只需要对候选分片做精确判断
+    xs = np.array([p[0] for p in points])
+    ys = np.array([p[1] for p in points])
+
+    # 粗栅格短路：瓦片覆盖的格子全部属于同一个明确分组时直接返回，
+    # 跳过STRtree和逐分片PIP；边界附近的格子被标记为模糊，走精确路径
+    if group_grid is not None:
+        grid_groups = _grid_lookup(xs, ys)
+        if grid_groups is not None:
+            return grid_groups
+
+    # 几何数据加载失败时province_tree为None，跳过空间索引路径，
+    # 落到底部基于经纬度的后备逻辑，保持服务可用
     matched_provinces = set()
-    for lng, lat in points:
-        point = Point(lng, lat)
-        for code, geometry in province_geometries.items():
-            if geometry.contains(point):
-                matched_provinces.add(code)
-                break  # 找到匹配省份后不再继续检查
-    
-    # 如果没有匹配到任何省份，尝试使用更精确的匹配方法
-    if not matched_provinces:
-        print(f"No province matched for tile ({z}, {x}, {y}), trying alternative method")
-        # 计算瓦片的所有边界点
-        edge_points = []
-        step = 10  # 采样步长
-        for i in range(0, 256, step):
-            for j in [0, 255]:
-                mx = minx + (maxx - minx) * i / 256
-                my = miny + (maxy - miny) * j / 256
-                edge_points.append(mercator_to_lnglat(mx, my))
-            for j in range(0, 256, step):
-                mx = minx if i == 0 else maxx
-                my = miny + (maxy - miny) * j / 256
-                edge_points.append(mercator_to_lnglat(mx, my))
-        
-        # 再次尝试匹配
-        for lng, lat in edge_points:
-            point = Point(lng, lat)
-            for code, geometry in province_geometries.items():
-                if geometry.contains(point):
-                    matched_provinces.add(code)
-                    break  # 找到匹配省份后不再继续检查
-            
-            if matched_provinces:  # 如果找到匹配，不再继续检查
-                break
-    
+    if province_tree is not None:
+        tile_box = box(xs.min(), ys.min(), xs.max(), ys.max())
+        candidate_shards = province_tree.query(tile_box)
+
+        # 检查采样点位于哪些候选分片：intersects_xy一次C调用批量判断9个点
+        _match_shards(candidate_shards, xs, ys, matched_provinces)
+
+        # 如果没有匹配到任何省份，尝试使用更精确的匹配方法
+        if not matched_provinces:
+            logger.debug("No province matched for tile (%s, %s, %s), trying alternative method", z, x, y)
+            # 沿瓦片四条边均匀采样，用numpy一次性构建并转换所有边界点
+            step = 10  # 采样步长
+            frac = np.arange(0, 256, step) / 256.0
+            edge_mx = minx + (maxx - minx) * frac
+            edge_my = miny + (maxy - miny) * frac
+            edge_xs = np.concatenate([edge_mx, edge_mx,
+                                      np.full_like(edge_my, minx), np.full_like(edge_my, maxx)])
+            edge_ys = np.concatenate([np.full_like(edge_mx, miny), np.full_like(edge_mx, maxy),
+                                      edge_my, edge_my])
+            edge_lngs, edge_lats = mercator_to_lnglat_arr(edge_xs, edge_ys)
+
+            # 再次尝试匹配：边界点都落在瓦片范围内，直接复用上面的候选分片
+            _match_shards(candidate_shards, edge_lngs, edge_lats, matched_provinces)
+
+
     # 如果仍然没有匹配到任何省份，使用基于经纬度的旧逻辑作为后备
     if not matched_provinces:
-        print(f"Still no province matched for tile ({z}, {x}, {y}), using fallback logic")
+        logger.debug("Still no province matched for tile (%s, %s, %s), using fallback logic", z, x, y)
         lng, lat = points[0]  # 使用中心点的经纬度
         # 优化后的经纬度分区逻辑
-        if lat > 40 and lng < 125: return PROVINCE_GROUPS['northeast']
+        if lat > 40 and lng < 125: return frozenset({'northeast'})
         elif lng < 105:
-            if lat > 38: return PROVINCE_GROUPS['northwest']
-            else: return PROVINCE_GROUPS['southwest']
-        elif lng < 115: return PROVINCE_GROUPS['central']
-        elif lng < 122: return PROVINCE_GROUPS['east']
-        else: return PROVINCE_GROUPS['north']
-    
-    # 获取匹配省份的组
-    groups = {CODE_TO_GROUP.get(code, 'unknown') for code in matched_provinces}
-    # 展平所有匹配组的省份代码
-    result = sum([PROVINCE_GROUPS.get(group, []) for group in groups], [])
-    
-    # print(f"Tile ({z}, {x}, {y}) matched provinces: {matched_provinces}, groups: {groups}, result: {result}")
-    return result
+            if lat > 38: return frozenset({'northwest'})
+            else: return frozenset({'southwest'})
+        elif lng < 115: return frozenset({'central'})
+        elif lng < 122: return frozenset({'east'})
+        else: return frozenset({'north'})
+
+    # 获取匹配省份的组（不在分组映射中的省份代码不影响结果，直接丢弃）
+    groups = frozenset(CODE_TO_GROUP[code] for code in matched_provinces
+                       if code in CODE_TO_GROUP)
+
+    # print(f"Tile ({z}, {x}, {y}) matched provinces: {matched_provinces}, groups: {groups}")
+    return groups
 
 def wms_to_xyz(z, x, y, wms_url):
     """Convert XYZ tile request to WMS request with proper province groups"""
-    provinces = get_province_group(z, x, y)
-    layers = ",".join([f"QGSFKYFW:sf{code}0000" for code in provinces])
-    styles = ",".join(["QGSFKYFW:shifeikongyu"] * len(provinces))
+    groups_key = get_province_group(z, x, y)
+    layers, styles = GROUP_LAYERS[groups_key]
     
     params = {
         "service": "WMS",
@@ -240,7 +482,12 @@ def wms_to_xyz(z, x, y, wms_url):
         "transparent": "true"
     }
     # print("wms_to_xyz wms_url：{} params：{}".format(wms_url, params))
-    response = requests.get(wms_url, params=params, timeout=10)
+    # httpx的params会整体替换URL原有的查询串（requests是合并），
+    # 用copy_merge_params保留wms_url里携带的token
+    response = SESSION.get(httpx.URL(wms_url).copy_merge_params(params), timeout=10)
+    # 4xx/5xx的响应体是WMS错误XML而非瓦片，抛异常交给get_tile返回
+    # 透明PNG，避免错误内容进入缓存被钉住一整天
+    response.raise_for_status()
 
     # request = response.request
     # # 获取请求 URL
@@ -253,26 +500,50 @@ def wms_to_xyz(z, x, y, wms_url):
 def get_tile(z, x, y):
     """Tile endpoint serving WMS-proxied content"""
     try:
-        tile_data = wms_to_xyz(z, x, y, WMS_URL)
-        return tile_data, 200, {'Content-Type': 'image/png'}
+        key = (z, x, y)
+        with TILE_MEM_LOCK:
+            tile_data = TILE_MEM_CACHE.get(key)
+        if tile_data is None:
+            # 内存未命中时查磁盘，命中则回填内存
+            tile_data = TILE_DISK_CACHE.get(key)
+            if tile_data is not None:
+                with TILE_MEM_LOCK:
+                    TILE_MEM_CACHE[key] = tile_data
+        if tile_data is None:
+            tile_data = wms_to_xyz(z, x, y, WMS_URL)
+            with TILE_MEM_LOCK:
+                TILE_MEM_CACHE[key] = tile_data
+            TILE_DISK_CACHE.set(key, tile_data, expire=TILE_CACHE_TTL)
+        # ETag/Cache-Control让浏览器和CDN也参与缓存
+        headers = {
+            'Content-Type': 'image/png',
+            'Cache-Control': f'public, max-age={TILE_CACHE_TTL}',
+            'ETag': hashlib.md5(tile_data).hexdigest(),
+        }
+        return tile_data, 200, headers
     except Exception as e:
-        print(f"Error generating tile: {e}")
+        logger.error("Error generating tile: %s", e)
         # Return transparent 1x1 PNG on error
         return (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82', 
                 200, 
                 {'Content-Type': 'image/png'})
 
 
+# 模块导入时加载省份几何信息：gunicorn的每个worker在import时各自加载一次。
+# 生产环境启动（不再使用Werkzeug单线程开发服务器）:
+#   gunicorn -w $(nproc) --threads 8 -k gthread -b 0.0.0.0:5000 main:app
+# 或配合gevent协作式I/O:
+#   gunicorn -k gevent -w 4 --worker-connections 500 -b 0.0.0.0:5000 main:app
+load_province_geometries()
+
+
 if __name__ == '__main__':
-    load_province_geometries()  # 启动时加载省份几何信息
     print("Province group mappings:", PROVINCE_GROUPS)
     # 验证特定瓦片
     test_z, test_x, test_y = 18, 215204, 163762
-    test_provinces = get_province_group(test_z, test_x, test_y)
-    print(f"Test tile ({test_z}, {test_x}, {test_y}) provinces: {test_provinces}")
-   
-    test_z, test_x, test_y = 18, 215207, 98384 
-    test_provinces = get_province_group(test_z, test_x, test_y)
-    print(f"Test tile ({test_z}, {test_x}, {test_y}) provinces: {test_provinces}")
-
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    test_groups = get_province_group(test_z, test_x, test_y)
+    print(f"Test tile ({test_z}, {test_x}, {test_y}) groups: {sorted(test_groups)}")
+
+    test_z, test_x, test_y = 18, 215207, 98384
+    test_groups = get_province_group(test_z, test_x, test_y)
+    print(f"Test tile ({test_z}, {test_x}, {test_y}) groups: {sorted(test_groups)}")
\ No newline at end of file